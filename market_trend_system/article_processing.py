@@ -0,0 +1,52 @@
+# article_processing.py
+import re
+import html
+import datetime
+
+
+def clean_text(text):
+    if not text:
+        return ""
+    text = html.unescape(text)  # Unescape HTML entities like &
+    text = re.sub(r'<[^>]+>', '', text)  # Remove HTML tags
+    text = ' '.join(text.split())  # Remove excessive whitespace
+    return text
+
+
+def build_processed_article(event_data, symbol_index):
+    """Builds the processed_news row for a raw article event. Timestamps are ISO strings for insert_rows_json."""
+    published_dt = datetime.datetime.fromisoformat(event_data["published_at_str"])
+    title_cleaned = clean_text(event_data.get("title"))
+    summary_cleaned = clean_text(event_data.get("summary"))
+
+    return {
+        "session_id": event_data["session_id"],
+        "article_id": event_data["article_id"],
+        "title": title_cleaned,
+        "url": event_data.get("url"),
+        "summary_cleaned": summary_cleaned,
+        "published_at": published_dt.isoformat(),
+        "feed_source": event_data.get("feed_source"),
+        "gcs_raw_path": event_data.get("gcs_raw_path"),
+        "processed_at": datetime.datetime.utcnow().isoformat(),
+        "mentioned_symbols": symbol_index.match_symbols(f"{title_cleaned} {summary_cleaned}"),
+        # sentiment fields will be null unless scored by a pipeline worker
+    }
+
+
+def get_sentiment_label(compound_score):
+    if compound_score >= 0.05:
+        return 'positive'
+    elif compound_score <= -0.05:
+        return 'negative'
+    else:
+        return 'neutral'
+
+
+def score_sentiment(analyzer, title, summary):
+    """Returns (compound_score, label) for an article using a VADER SentimentIntensityAnalyzer."""
+    text_to_analyze = (title or "") + " " + (summary or "")
+    if not text_to_analyze.strip():
+        return 0.0, 'neutral'
+    compound_score = analyzer.polarity_scores(text_to_analyze)['compound']
+    return compound_score, get_sentiment_label(compound_score)
@@ -0,0 +1,63 @@
+# completion_barrier.py
+import threading
+
+
+class SessionCompletionBarrier:
+    """
+    Tracks, per session and stream ("news", "financial"), how many items the gatherer announced
+    (the `count` on EVENT_ALL_RAW_*_GATHERED) against how many were persisted or failed.
+
+    A session is ready once every stream has its expected count and persisted + failed has reached it.
+    release() hands out a summary exactly once per session, whether it is called because the session
+    settled or because its deadline passed.
+    """
+
+    def __init__(self, streams):
+        self.streams = tuple(streams)
+        self._lock = threading.Lock()
+        self._sessions = {}  # { "session_id": {"news": {"expected": None, "persisted": 0, "failed": 0}, ...} }
+        self._armed = set()  # Sessions whose first expect() has been seen
+        self._released = set()
+
+    def _state(self, session_id, stream):
+        session = self._sessions.setdefault(
+            session_id, {s: {"expected": None, "persisted": 0, "failed": 0} for s in self.streams})
+        return session[stream]
+
+    def record(self, session_id, stream, ok=True):
+        with self._lock:
+            if session_id in self._released:
+                return  # Late arrival after a timeout release; already reported as partial
+            self._state(session_id, stream)["persisted" if ok else "failed"] += 1
+
+    def expect(self, session_id, stream, count):
+        """Sets the expected count. Returns True the first time any stream of the session does so."""
+        with self._lock:
+            if session_id in self._released:
+                return False  # Late signal after a timeout release; do not resurrect the session
+            self._state(session_id, stream)["expected"] = count
+            if session_id in self._armed:
+                return False
+            self._armed.add(session_id)
+            return True
+
+    def is_settled(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session_id in self._released:
+                return False
+            return all(s["expected"] is not None and s["persisted"] + s["failed"] >= s["expected"]
+                       for s in session.values())
+
+    def release(self, session_id):
+        """Returns { stream: {"expected", "persisted", "failed", "complete"} } once, then None."""
+        with self._lock:
+            if session_id in self._released or session_id not in self._sessions:
+                return None
+            self._released.add(session_id)
+            self._armed.discard(session_id)
+            session = self._sessions.pop(session_id)
+        return {stream: {**state,
+                         "complete": state["expected"] is not None and state["failed"] == 0
+                                     and state["persisted"] >= state["expected"]}
+                for stream, state in session.items()}
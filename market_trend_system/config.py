@@ -18,13 +18,43 @@ NEWS_RSS_FEEDS = {
 }
 # Note: Some RSS feeds might require user-agents or have other restrictions. Test them.
 
+# Adaptive feed polling (see feed_scheduler.py): each feed is only fetched when it is due
+FEED_POLL_MIN_INTERVAL_SECONDS = 300 # Never poll a feed more often than this
+FEED_POLL_MAX_INTERVAL_SECONDS = 24 * 3600 # Healthy feeds are polled at least this often
+FEED_POLL_MAX_BACKOFF_SECONDS = 7 * 24 * 3600 # Cap for erroring feeds; dead feeds (HTTP 404/410) go straight here
+FEED_POLL_TARGET_NEW_ENTRIES = 10 # Aim for about this many new entries per poll
+FEED_POLL_RATE_SMOOTHING = 0.5 # EWMA weight of the newest arrival-rate observation
+FEED_POLL_IDLE_GROWTH = 1.5 # Interval multiplier when a poll yields nothing to estimate a rate from
+FEED_POLL_STALE_AFTER_SECONDS = 14 * 24 * 3600 # Newest entry older than this: the feed may back off past the max interval
+FEED_POLL_EARLY_TOLERANCE = 0.1 # A feed counts as due up to this fraction of its interval early
+FEED_SCHEDULER_STATE_GCS_PATH = "raw_data/feed_scheduler_state.json"
+
 # Stock/Index Symbols
 STOCK_SYMBOLS = ["SPY", "QQQ", "AAPL", "GOOGL", "MSFT"] # GOOGL instead of GOOG for Alpha Vantage
 
+# Company names / aliases used to link news articles to symbols (matched case-insensitively on word boundaries).
+# The ticker itself is always matched, so only list the extra names here.
+SYMBOL_ALIASES = {
+    "SPY": ["S&P 500", "S&P500", "SPDR S&P"],
+    "QQQ": ["Nasdaq 100", "Nasdaq-100", "Invesco QQQ"],
+    "AAPL": ["Apple", "iPhone", "Tim Cook"],
+    "GOOGL": ["Alphabet", "Google", "YouTube"],
+    "MSFT": ["Microsoft", "Azure", "Satya Nadella"],
+}
+
 # GCS Paths
 RAW_DATA_GCS_PATH_PREFIX = "raw_data"
 REPORTS_GCS_PATH_PREFIX = "reports"
 
+# Reports
+REPORT_ARTICLES_PER_PAGE = 100 # Articles per HTML page; large sessions are split across pages
+REPORT_TOP_ARTICLES = 5 # Highest-sentiment articles shown on the main report
+REPORT_EXTRACT_BATCH_ROWS = 10000 # Rows per Arrow batch when streaming Parquet extracts
+
+# Local columnar session snapshots (see session_snapshot.py)
+SNAPSHOT_LOCAL_DIR = "snapshots" # One sub-directory per session: news.arrow, financials.arrow, manifest.json
+SNAPSHOT_BATCH_ROWS = 10000 # Rows per Arrow batch when streaming a session out of BigQuery
+
 # BigQuery Table Names
 BQ_TABLE_PROCESSED_NEWS = "processed_news"
 BQ_TABLE_PROCESSED_FINANCIALS = "processed_financials"
@@ -43,9 +73,27 @@ EVENT_FINANCIAL_PROCESSED_FOR_SESSION = "financial_processed_for_session"
 EVENT_TRENDS_IDENTIFIED_FOR_SESSION = "trends_identified_for_session"
 EVENT_REPORT_GENERATED = "report_generated_for_session"
 
+# Pipeline workers (see sharded_workers.py)
+PIPELINE_WORKER_PROCESSES = 0 # 0 = process news in-line in the ADK runtime; N > 0 = shard across N processes
+PIPELINE_WORKER_BATCH_SIZE = 200 # Rows per BigQuery streaming insert from a worker
+PIPELINE_WORKER_FLUSH_SECONDS = 1.0 # A worker flushes a partial batch after being idle this long
+PIPELINE_WORKER_MAX_RESTARTS = 3 # Restarts per crashed worker before its shard's articles are failed outright
+EVENT_NEWS_WORKER_RESULTS = "news_worker_results" # Internal: hands worker results to DataProcessorAgent's runtime thread
+
+# Processing barrier: downstream stages start once the rows announced by the gatherers have landed in BigQuery
+PROCESSING_BARRIER_TIMEOUT_SECONDS = 900 # After the first "gathered" signal, publish whatever has landed (partial)
+PROCESSING_BARRIER_VISIBILITY_TIMEOUT_SECONDS = 120 # Max wait for persisted rows to become queryable
+PROCESSING_BARRIER_POLL_SECONDS = 5 # Interval between BigQuery row-count checks
+
 # Trend Identification
 FINANCIAL_ANOMALY_THRESHOLD_PERCENT = 5.0 # e.g., 5% change
 
+# News-price correlation
+NEWS_PRICE_CORRELATION_LOOKBACK_DAYS = 90 # History window used for lagged sentiment/price correlations
+NEWS_PRICE_CORRELATION_MAX_LAG_DAYS = 3 # Correlate price change with sentiment from 0..N market days earlier
+NEWS_PRICE_CORRELATION_MIN_OBSERVATIONS = 5 # Fewer paired days than this yields no correlation
+NEWS_DRIVING_MOVE_MAX_ARTICLES = 3 # Articles listed per anomaly in the "news driving the move" section
+
 # Utility
 def get_current_session_id():
     return datetime.datetime.utcnow().strftime('%Y-%m-%d')
\ No newline at end of file
@@ -1,24 +1,43 @@
 # data_processor_agent.py
 import google.adk as adk
-import re
-import html
 import logging
+import threading
+import time
 from google.cloud import bigquery
 import datetime
 from . import config
+from .article_processing import build_processed_article
+from .completion_barrier import SessionCompletionBarrier
+from .sharded_workers import ShardedArticleDispatcher
+from .symbol_index import SymbolArticleIndex
 
 logger = logging.getLogger(__name__)
 
 
 class DataProcessorAgent(adk.Agent):
-    def __init__(self):
+    def __init__(self, num_workers=0):
         super().__init__()
         self.bq_client = bigquery.Client(project=config.BQ_PROJECT_ID)
         self._ensure_bq_dataset_exists()
         self._ensure_bq_tables_exist()
 
-        # State to track completion for a session
-        self.raw_completion_status = {}  # { "session_id": {"news": False, "financial": False}}
+        # Compares the counts announced by the gatherers with the rows actually persisted, per session
+        # (the PROCESSING_BARRIER_TIMEOUT_SECONDS deadline is enforced by barrier_timers)
+        self.completion_barrier = SessionCompletionBarrier(("news", "financial"))
+        self.barrier_timers = {}  # { "session_id": threading.Timer }
+        # Symbol -> article_id index, built once per session as articles are processed
+        self.symbol_indexes = {}  # { "session_id": SymbolArticleIndex }
+        # When this run first saw each session; session IDs are dates, so earlier runs' rows share them
+        self.session_started_at = {}  # { "session_id": naive UTC datetime }
+        # Guards the session state above; barrier timeouts fire on timer threads
+        self._status_lock = threading.RLock()
+
+        # Optional multi-process mode: raw news is sharded by article_id across worker processes
+        self.dispatcher = None
+        if num_workers > 0:
+            self.dispatcher = ShardedArticleDispatcher(num_workers, on_results=self._forward_worker_results)
+            self.dispatcher.start()
+            self.register_event_handler(config.EVENT_NEWS_WORKER_RESULTS, self.handle_worker_results)
 
         self.register_event_handler(config.EVENT_NEWS_ARTICLE_RAW, self.handle_raw_news)
         self.register_event_handler(config.EVENT_FINANCIAL_DATA_POINT_RAW, self.handle_raw_financial_data)
@@ -51,9 +70,11 @@ class DataProcessorAgent(adk.Agent):
             bigquery.SchemaField("processed_at", "TIMESTAMP", mode="REQUIRED"),
             bigquery.SchemaField("sentiment_score", "FLOAT"),  # Populated by TrendIdentificationAgent
             bigquery.SchemaField("sentiment_label", "STRING"),  # Populated by TrendIdentificationAgent
+            bigquery.SchemaField("mentioned_symbols", "STRING", mode="REPEATED"),  # Symbols matched via SYMBOL_ALIASES
         ]
         try:
-            self.bq_client.get_table(news_table_id)
+            news_table = self.bq_client.get_table(news_table_id)
+            self._add_missing_columns(news_table, news_schema)
         except Exception:
             table = bigquery.Table(news_table_id, schema=news_schema)
             self.bq_client.create_table(table)
@@ -81,61 +102,89 @@ class DataProcessorAgent(adk.Agent):
             self.bq_client.create_table(table)
             logger.info(f"Created BigQuery table {financials_table_id}")
 
-    def _clean_text(self, text):
-        if not text:
-            return ""
-        text = html.unescape(text)  # Unescape HTML entities like &
-        text = re.sub(r'<[^>]+>', '', text)  # Remove HTML tags
-        text = ' '.join(text.split())  # Remove excessive whitespace
-        return text
+    def _add_missing_columns(self, table, schema):
+        # Tables created before a column was introduced get it appended (BigQuery allows additive schema changes)
+        existing = {field.name for field in table.schema}
+        missing = [field for field in schema if field.name not in existing]
+        if missing:
+            table.schema = list(table.schema) + missing
+            self.bq_client.update_table(table, ["schema"])
+            logger.info(f"Added columns {[f.name for f in missing]} to BigQuery table {table.table_id}")
+
+    def _mark_session_started(self, session_id):
+        with self._status_lock:
+            self.session_started_at.setdefault(session_id, datetime.datetime.utcnow())
+
+    def _get_symbol_index(self, session_id):
+        with self._status_lock:
+            return self.symbol_indexes.setdefault(session_id, SymbolArticleIndex())
+
+    def _forward_worker_results(self, results):
+        # Called on the dispatcher's collector thread: hand the results to the runtime rather than handling them here
+        self.publish(config.EVENT_NEWS_WORKER_RESULTS, {"results": results})
+
+    def handle_worker_results(self, event_name, event_data):
+        sessions = set()
+        for result in event_data["results"]:
+            session_id = result["session_id"]
+            sessions.add(session_id)
+            if result["ok"]:
+                self._get_symbol_index(session_id).add(result["article_id"], result["mentioned_symbols"])
+            else:
+                logger.error(f"[{session_id}] Worker failed to process news {result['article_id']}: {result['error']}")
+            self.completion_barrier.record(session_id, "news", ok=result["ok"])
+        for session_id in sessions:
+            self._check_and_publish_processed_session(session_id)
+
+    def stop_workers(self):
+        if self.dispatcher:
+            self.dispatcher.stop()
 
     def handle_raw_news(self, event_name, event_data):
         session_id = event_data["session_id"]
+        self._mark_session_started(session_id)
         logger.debug(f"[{session_id}] Processing raw news: {event_data.get('title', 'N/A')[:50]}...")
 
-        try:
-            # Convert published_at_str to datetime object then to BQ compatible TIMESTAMP
-            published_dt = datetime.datetime.fromisoformat(event_data["published_at_str"])
+        if self.dispatcher:
+            # Cleaning, sentiment scoring and the BQ insert happen in a worker process
+            self.dispatcher.dispatch(event_data)
+            return
 
-            processed_article = {
-                "session_id": session_id,
-                "article_id": event_data["article_id"],
-                "title": self._clean_text(event_data.get("title")),
-                "url": event_data.get("url"),
-                "summary_cleaned": self._clean_text(event_data.get("summary")),
-                "published_at": published_dt,
-                "feed_source": event_data.get("feed_source"),
-                "gcs_raw_path": event_data.get("gcs_raw_path"),
-                "processed_at": datetime.datetime.utcnow(),
-                # sentiment fields will be null initially
-            }
+        try:
+            symbol_index = self._get_symbol_index(session_id)
+            processed_article = build_processed_article(event_data, symbol_index)
             table_id = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
             errors = self.bq_client.insert_rows_json(table_id, [processed_article])
             if errors:
                 logger.error(f"[{session_id}] BQ insert errors for news {event_data['article_id']}: {errors}")
             else:
+                symbol_index.add(event_data["article_id"], processed_article["mentioned_symbols"])
                 logger.debug(f"[{session_id}] Successfully inserted processed news {event_data['article_id']} to BQ.")
+            self.completion_barrier.record(session_id, "news", ok=not errors)
         except Exception as e:
             logger.error(f"[{session_id}] Error processing raw news {event_data.get('article_id')}: {e}", exc_info=True)
+            self.completion_barrier.record(session_id, "news", ok=False)
+        self._check_and_publish_processed_session(session_id)
 
     def handle_raw_financial_data(self, event_name, event_data):
         session_id = event_data["session_id"]
+        self._mark_session_started(session_id)
         logger.debug(f"[{session_id}] Processing raw financial data for {event_data.get('symbol')}")
 
         try:
-            # Convert date string to date object
+            # Validate the date string; insert_rows_json needs JSON types, so dates go in as strings
             market_date_obj = datetime.datetime.strptime(event_data["date"], "%Y-%m-%d").date()
 
             processed_financial_data = {
                 "session_id": session_id,
                 "symbol": event_data["symbol"],
-                "date": market_date_obj,
+                "date": market_date_obj.strftime("%Y-%m-%d"),
                 "open_price": float(event_data["open"]),
                 "high_price": float(event_data["high"]),
                 "low_price": float(event_data["low"]),
                 "close_price": float(event_data["close_price"]),
                 "volume": int(event_data["volume"]),
-                "processed_at": datetime.datetime.utcnow(),
+                "processed_at": datetime.datetime.utcnow().isoformat(),
                 # daily_change_pct and is_anomaly will be null initially
             }
             table_id = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_FINANCIALS}"
@@ -145,31 +194,119 @@ class DataProcessorAgent(adk.Agent):
             else:
                 logger.debug(
                     f"[{session_id}] Successfully inserted processed financial data for {event_data['symbol']} to BQ.")
+            self.completion_barrier.record(session_id, "financial", ok=not errors)
         except Exception as e:
             logger.error(f"[{session_id}] Error processing raw financial data {event_data.get('symbol')}: {e}",
                          exc_info=True)
+            self.completion_barrier.record(session_id, "financial", ok=False)
+        self._check_and_publish_processed_session(session_id)
+
+    def _count_visible_rows(self, session_id, table_name, key_column, since):
+        # Streamed rows sit in the streaming buffer first; count what queries can actually see.
+        # Only this run's rows: an earlier run on the same day wrote to the same session_id.
+        table_id = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{table_name}"
+        query = f"""
+            SELECT COUNT(DISTINCT {key_column}) AS row_count
+            FROM `{table_id}`
+            WHERE session_id = @session_id AND processed_at >= @since
+        """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("session_id", "STRING", session_id),
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)
+        ])
+        return next(iter(self.bq_client.query(query, job_config=job_config).result())).row_count
+
+    def _wait_for_rows_visible(self, session_id, summary, timeout_seconds):
+        """Polls BigQuery until the persisted rows are queryable or the time runs out. Annotates summary."""
+        checks = (("news", config.BQ_TABLE_PROCESSED_NEWS, "article_id"),
+                  ("financial", config.BQ_TABLE_PROCESSED_FINANCIALS, "symbol"))
+        with self._status_lock:
+            since = self.session_started_at.get(session_id, datetime.datetime.utcnow())
+        deadline = time.monotonic() + timeout_seconds
+        for stream, table_name, key_column in checks:
+            stats = summary[stream]
+            while True:
+                try:
+                    stats["visible"] = self._count_visible_rows(session_id, table_name, key_column, since)
+                except Exception as e:
+                    logger.warning(f"[{session_id}] Could not count visible {stream} rows: {e}")
+                    stats["visible"] = None
+                    break
+                if stats["visible"] >= stats["persisted"] or time.monotonic() >= deadline:
+                    break
+                time.sleep(config.PROCESSING_BARRIER_POLL_SECONDS)
+            if stats["visible"] is not None and stats["visible"] < stats["persisted"]:
+                stats["complete"] = False
+                logger.warning(f"[{session_id}] Only {stats['visible']}/{stats['persisted']} persisted {stream} rows "
+                               f"visible in BigQuery before the barrier deadline.")
+
+    def _start_barrier_timer(self, session_id):
+        timer = threading.Timer(config.PROCESSING_BARRIER_TIMEOUT_SECONDS, self._handle_barrier_timeout,
+                                args=(session_id,))
+        timer.daemon = True
+        with self._status_lock:
+            self.barrier_timers[session_id] = timer
+        timer.start()
+
+    def _handle_barrier_timeout(self, session_id):
+        summary = self.completion_barrier.release(session_id)
+        if summary is None:
+            with self._status_lock:
+                self.barrier_timers.pop(session_id, None)
+            return  # Already released normally
+        logger.warning(f"[{session_id}] Processing barrier timed out after "
+                       f"{config.PROCESSING_BARRIER_TIMEOUT_SECONDS}s; publishing partial session: {summary}")
+        self._publish_processed_session(session_id, summary)
 
     def _check_and_publish_processed_session(self, session_id):
-        if session_id in self.raw_completion_status and \
-                self.raw_completion_status[session_id].get("news", False) and \
-                self.raw_completion_status[session_id].get("financial", False):
-            logger.info(
-                f"[{session_id}] Both news and financial raw data gathered. Publishing processed session events.")
-            self.publish(config.EVENT_NEWS_PROCESSED_FOR_SESSION, {"session_id": session_id})
-            self.publish(config.EVENT_FINANCIAL_PROCESSED_FOR_SESSION, {"session_id": session_id})
+        if not self.completion_barrier.is_settled(session_id):
+            return
+        summary = self.completion_barrier.release(session_id)
+        if summary is None:
+            return  # Another thread (or the timeout) got here first
+        with self._status_lock:
+            timer = self.barrier_timers.get(session_id)
+        if timer:
+            timer.cancel()
+        logger.info(f"[{session_id}] All announced news and financial items accounted for: {summary}. "
+                    f"Waiting for rows to be queryable.")
+        # The visibility wait polls for up to a couple of minutes, so keep it off the runtime's event thread
+        threading.Thread(target=self._publish_when_visible, args=(session_id, summary),
+                         name=f"processed-session-{session_id}", daemon=True).start()
 
-            # Clean up status for this session
-            del self.raw_completion_status[session_id]
+    def _publish_when_visible(self, session_id, summary):
+        try:
+            self._wait_for_rows_visible(session_id, summary, config.PROCESSING_BARRIER_VISIBILITY_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error(f"[{session_id}] Error waiting for processed rows to be visible: {e}", exc_info=True)
+        self._publish_processed_session(session_id, summary)
+
+    def _publish_processed_session(self, session_id, summary):
+        with self._status_lock:
+            symbol_index = self.symbol_indexes.pop(session_id, None)
+            self.barrier_timers.pop(session_id, None)
+            self.session_started_at.pop(session_id, None)
+        logger.info(f"[{session_id}] Publishing processed session events.")
+        self.publish(config.EVENT_NEWS_PROCESSED_FOR_SESSION, {
+            "session_id": session_id,
+            "symbol_article_index": symbol_index.to_dict() if symbol_index else {},
+            **summary["news"]
+        })
+        self.publish(config.EVENT_FINANCIAL_PROCESSED_FOR_SESSION, {"session_id": session_id, **summary["financial"]})
 
     def handle_all_raw_news_gathered(self, event_name, event_data):
         session_id = event_data["session_id"]
+        self._mark_session_started(session_id)
         logger.info(f"[{session_id}] All raw news gathered signal received ({event_data.get('count', 0)} articles).")
-        self.raw_completion_status.setdefault(session_id, {})["news"] = True
+        if self.completion_barrier.expect(session_id, "news", event_data.get("count", 0)):
+            self._start_barrier_timer(session_id)
         self._check_and_publish_processed_session(session_id)
 
     def handle_all_raw_financial_gathered(self, event_name, event_data):
         session_id = event_data["session_id"]
+        self._mark_session_started(session_id)
         logger.info(
             f"[{session_id}] All raw financial data gathered signal received ({event_data.get('count', 0)} symbols).")
-        self.raw_completion_status.setdefault(session_id, {})["financial"] = True
-        self._check_and_publish_processed_session(session_id)
\ No newline at end of file
+        if self.completion_barrier.expect(session_id, "financial", event_data.get("count", 0)):
+            self._start_barrier_timer(session_id)
+        self._check_and_publish_processed_session(session_id)
@@ -0,0 +1,164 @@
+# feed_scheduler.py
+import calendar
+import json
+import logging
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEAD_FEED_HTTP_STATUSES = (404, 410)
+
+
+def entry_key(entry):
+    """Stable identity for a feed entry: its GUID, else its link. None if it has neither."""
+    return getattr(entry, 'id', None) or getattr(entry, 'link', None)
+
+
+def entry_timestamp(entry):
+    """Entry publish time as a UTC epoch, from the same fields NewsScraperAgent reads. None if absent."""
+    parsed = getattr(entry, 'published_parsed', None) or getattr(entry, 'updated_parsed', None)
+    return calendar.timegm(parsed) if parsed else None  # feedparser normalizes *_parsed to UTC
+
+
+class FeedPollScheduler:
+    """
+    Decides which feeds are worth fetching on a run, based on how often each feed actually publishes.
+
+    After every fetch the entry arrival rate is estimated from the entries published since the previous
+    poll, over the time elapsed since it, and the next poll is scheduled so that roughly
+    FEED_POLL_TARGET_NEW_ENTRIES new items have accumulated, clamped to
+    [FEED_POLL_MIN_INTERVAL_SECONDS, FEED_POLL_MAX_INTERVAL_SECONDS]. Polls that find nothing new decay the
+    rate, and feeds whose newest entry is older than FEED_POLL_STALE_AFTER_SECONDS may stretch out to
+    FEED_POLL_MAX_BACKOFF_SECONDS. Errors back off exponentially up to that same cap, and feeds answering
+    404/410 go straight there.
+    It also remembers which entries were already published, so polling a feed more often than it
+    rotates does not emit the same articles again. State (including ETag/Last-Modified for conditional
+    GETs) is persisted to GCS between runs.
+    """
+
+    def __init__(self, bucket, state_path=config.FEED_SCHEDULER_STATE_GCS_PATH):
+        self.bucket = bucket
+        self.state_path = state_path
+        self.feeds = self._load_state()  # { "feed_name": {...} }
+
+    def _load_state(self):
+        try:
+            blob = self.bucket.get_blob(self.state_path)
+            return json.loads(blob.download_as_bytes()).get("feeds", {}) if blob is not None else {}
+        except Exception as e:
+            logger.warning(f"Could not load feed scheduler state from {self.state_path}, starting fresh: {e}")
+            return {}
+
+    def save(self):
+        try:
+            self.bucket.blob(self.state_path).upload_from_string(
+                json.dumps({"feeds": self.feeds}, indent=2, sort_keys=True), content_type='application/json')
+        except Exception as e:
+            logger.error(f"Could not save feed scheduler state to {self.state_path}: {e}", exc_info=True)
+
+    def _state(self, feed_name):
+        return self.feeds.setdefault(feed_name, {
+            "interval_seconds": config.FEED_POLL_MIN_INTERVAL_SECONDS,
+            "healthy_interval_seconds": config.FEED_POLL_MIN_INTERVAL_SECONDS,  # Last interval set by a success
+            "next_poll_at": 0.0,
+            "last_polled_at": None,
+            "entries_per_hour": None,
+            "newest_entry_at": None,
+            "consecutive_errors": 0,
+            "etag": None,
+            "modified": None,
+            "seen_entry_keys": [],  # Entries already published; pruned to what the feed still serves
+        })
+
+    def is_due(self, feed_name, now):
+        state = self._state(feed_name)
+        # Runs are scheduled externally (e.g. daily), so allow a little earliness rather than skipping a whole run
+        tolerance = state["interval_seconds"] * config.FEED_POLL_EARLY_TOLERANCE
+        return now >= state["next_poll_at"] - tolerance
+
+    def due_feeds(self, feeds, now):
+        """Filters a { name: url } mapping down to the feeds due for a poll."""
+        return {name: url for name, url in feeds.items() if self.is_due(name, now)}
+
+    def conditional_request_args(self, feed_name):
+        state = self._state(feed_name)
+        return {"etag": state["etag"], "modified": state["modified"]}
+
+    def is_new_entry(self, feed_name, entry):
+        key = entry_key(entry)
+        return key is None or key not in self._state(feed_name).setdefault("seen_entry_keys", [])
+
+    def mark_entry_seen(self, feed_name, entry):
+        """Call once the entry has been published, so a failure later in the feed cannot re-emit it."""
+        key = entry_key(entry)
+        seen = self._state(feed_name).setdefault("seen_entry_keys", [])
+        if key is not None and key not in seen:
+            seen.append(key)
+
+    def _schedule(self, state, interval, now):
+        state["interval_seconds"] = interval
+        state["next_poll_at"] = now + interval
+
+    def record_success(self, feed_name, feed, now):
+        """
+        Updates the feed's rate estimate and interval from a parsed feedparser result. Call it only once the
+        feed's entries have all been handled: it stores the ETag/Last-Modified the next poll sends.
+        """
+        state = self._state(feed_name)
+        state["consecutive_errors"] = 0
+        state["etag"] = getattr(feed, 'etag', None) or state["etag"]
+        state["modified"] = getattr(feed, 'modified', None) or state["modified"]
+
+        if getattr(feed, 'status', None) == 304:
+            timestamps = []  # Not modified: nothing was published since the last poll
+        else:
+            timestamps = sorted(ts for ts in (entry_timestamp(e) for e in feed.entries) if ts is not None)
+            # Entries that dropped out of the feed cannot come back, so only its current ones need remembering
+            current_keys = {entry_key(e) for e in feed.entries}
+            state["seen_entry_keys"] = [k for k in state.get("seen_entry_keys", []) if k in current_keys]
+        if timestamps:
+            state["newest_entry_at"] = max(state.get("newest_entry_at") or 0.0, timestamps[-1])
+
+        since = state["last_polled_at"]
+        if timestamps and (since is None or timestamps[0] > since):
+            # First poll, or more new entries than the feed retains: measure from its oldest entry instead
+            since = timestamps[0]
+        elapsed_hours = (now - since) / 3600.0 if since is not None else 0.0
+
+        newest_entry_at = state.get("newest_entry_at")
+        stale = newest_entry_at is not None and now - newest_entry_at >= config.FEED_POLL_STALE_AFTER_SECONDS
+        max_interval = config.FEED_POLL_MAX_BACKOFF_SECONDS if stale else config.FEED_POLL_MAX_INTERVAL_SECONDS
+
+        if elapsed_hours > 0 and (timestamps or getattr(feed, 'status', None) == 304):
+            # New entries over the time it took them to appear, so a feed serving old entries scores ~0
+            observed = sum(1 for ts in timestamps if ts > since) / elapsed_hours
+            previous = state["entries_per_hour"]
+            alpha = config.FEED_POLL_RATE_SMOOTHING
+            state["entries_per_hour"] = observed if previous is None else alpha * observed + (1 - alpha) * previous
+            rate = state["entries_per_hour"]
+            interval = config.FEED_POLL_TARGET_NEW_ENTRIES / rate * 3600.0 if rate > 0 else max_interval
+        else:
+            # Too few dated entries to estimate a rate
+            interval = state["healthy_interval_seconds"] * config.FEED_POLL_IDLE_GROWTH
+
+        interval = min(max(interval, config.FEED_POLL_MIN_INTERVAL_SECONDS), max_interval)
+        state["healthy_interval_seconds"] = interval
+        state["last_polled_at"] = now
+        self._schedule(state, interval, now)
+        logger.debug(f"Feed {feed_name}: ~{state['entries_per_hour']} entries/h, next poll in {interval:.0f}s")
+
+    def record_failure(self, feed_name, now, http_status=None):
+        state = self._state(feed_name)
+        state["consecutive_errors"] += 1
+        # The fetch may have half-succeeded: drop the validators so the next poll gets the full feed again.
+        # last_polled_at stays at the last successful poll, which the rate estimate measures from.
+        state["etag"] = None
+        state["modified"] = None
+        if http_status in DEAD_FEED_HTTP_STATUSES:
+            interval = config.FEED_POLL_MAX_BACKOFF_SECONDS
+        else:
+            interval = min(state["healthy_interval_seconds"] * 2 ** state["consecutive_errors"],
+                           config.FEED_POLL_MAX_BACKOFF_SECONDS)
+        self._schedule(state, interval, now)
+        logger.warning(f"Feed {feed_name} failed {state['consecutive_errors']} time(s) in a row "
+                       f"(HTTP {http_status}); backing off {interval:.0f}s.")
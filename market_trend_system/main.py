@@ -1,5 +1,6 @@
 # main.py
 import google.adk as adk
+import argparse
 import logging
 import time
 from market_trend_system import config  # Assuming files are in a package 'market_trend_system'
@@ -8,6 +9,7 @@ from market_trend_system.financial_data_agent import FinancialDataAgent
 from market_trend_system.data_processor_agent import DataProcessorAgent
 from market_trend_system.trend_identification_agent import TrendIdentificationAgent
 from market_trend_system.report_generation_agent import ReportGenerationAgent
+from market_trend_system.session_snapshot import list_snapshot_sessions
 
 # Basic logging configuration
 logging.basicConfig(level=logging.INFO,
@@ -21,14 +23,16 @@ logger = logging.getLogger(__name__)
 # ... etc.
 
 
-def main():
+def main(num_workers=config.PIPELINE_WORKER_PROCESSES):
     logger.info("Initializing ADK Runtime and Agents...")
     runtime = adk.Runtime()
 
     # Register agents
+    # With num_workers > 0, news processing and sentiment scoring run in sharded worker processes
+    data_processor = DataProcessorAgent(num_workers=num_workers)
     runtime.register_agent(NewsScraperAgent())
     runtime.register_agent(FinancialDataAgent())
-    runtime.register_agent(DataProcessorAgent())
+    runtime.register_agent(data_processor)
     runtime.register_agent(TrendIdentificationAgent())
     runtime.register_agent(ReportGenerationAgent())
 
@@ -78,10 +82,30 @@ def main():
     finally:
         logger.info("Stopping ADK Runtime...")
         runtime.stop()
+        data_processor.stop_workers()
         logger.info("ADK Runtime stopped.")
 
 
+def regenerate_reports(session_ids):
+    """Re-renders and republishes past reports from local session snapshots, without running the pipeline."""
+    session_ids = session_ids or list_snapshot_sessions()
+    if not session_ids:
+        logger.warning(f"No session snapshots found under {config.SNAPSHOT_LOCAL_DIR}; nothing to regenerate.")
+        return
+    report_generator = ReportGenerationAgent()
+    for session_id in session_ids:
+        report_generator.regenerate_report(session_id)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the market trend analysis pipeline for today's session.")
+    parser.add_argument("--workers", type=int, default=config.PIPELINE_WORKER_PROCESSES,
+                        help="Worker processes for news processing/sentiment scoring (0 = in-process).")
+    parser.add_argument("--regenerate", nargs="*", metavar="SESSION_ID",
+                        help="Regenerate the reports of past sessions from local snapshots instead of running "
+                             "the pipeline (no IDs = every snapshotted session).")
+    args = parser.parse_args()
+
     # Ensure GCP credentials are set via GOOGLE_APPLICATION_CREDENTIALS environment variable
     # Fill in GCS_BUCKET_NAME, BQ_PROJECT_ID, ALPHA_VANTAGE_API_KEY in config.py
 
@@ -91,5 +115,7 @@ if __name__ == "__main__":
             "YOUR_ALPHA_VANTAGE_API_KEY" == config.ALPHA_VANTAGE_API_KEY:
         logger.error(
             "CRITICAL: Please update placeholder values in config.py (GCS_BUCKET_NAME, BQ_PROJECT_ID, ALPHA_VANTAGE_API_KEY) before running.")
+    elif args.regenerate is not None:
+        regenerate_reports(args.regenerate)
     else:
-        main()
\ No newline at end of file
+        main(num_workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,166 @@
+# news_price_correlation.py
+import datetime
+import heapq
+import logging
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+from . import config
+from .session_snapshot import list_snapshot_sessions, scan_snapshots
+
+logger = logging.getLogger(__name__)
+
+
+def fetch_sentiment_price_history(bq_client, session_id):
+    """
+    Per-symbol daily average sentiment next to daily_change_pct over the lookback window.
+    Articles are attributed to symbols through the mentioned_symbols column written by DataProcessorAgent.
+    """
+    news_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
+    financial_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_FINANCIALS}"
+    query = f"""
+        WITH DailySentiment AS (
+            SELECT symbol, DATE(published_at) AS date,
+                   AVG(sentiment_score) AS avg_sentiment, COUNT(*) AS article_count
+            FROM `{news_table}`, UNNEST(mentioned_symbols) AS symbol
+            WHERE sentiment_score IS NOT NULL
+              AND DATE(published_at) >= DATE_SUB(PARSE_DATE('%Y-%m-%d', @session_id), INTERVAL @lookback_days DAY)
+              AND DATE(published_at) <= PARSE_DATE('%Y-%m-%d', @session_id)
+            GROUP BY symbol, date
+        ),
+        DailyChange AS (
+            -- Each session stores the latest market day, so the same (symbol, date) can appear in several sessions
+            SELECT symbol, date, ANY_VALUE(daily_change_pct) AS daily_change_pct
+            FROM `{financial_table}`
+            WHERE daily_change_pct IS NOT NULL
+              AND date >= DATE_SUB(PARSE_DATE('%Y-%m-%d', @session_id), INTERVAL @lookback_days DAY)
+              AND date <= PARSE_DATE('%Y-%m-%d', @session_id)
+              AND symbol IN UNNEST(@stock_symbols)
+            GROUP BY symbol, date
+        )
+        SELECT c.symbol, c.date, c.daily_change_pct, s.avg_sentiment, IFNULL(s.article_count, 0) AS article_count
+        FROM DailyChange c
+        LEFT JOIN DailySentiment s ON c.symbol = s.symbol AND c.date = s.date
+        ORDER BY c.symbol, c.date
+    """
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("session_id", "STRING", session_id),
+        bigquery.ScalarQueryParameter("lookback_days", "INT64", config.NEWS_PRICE_CORRELATION_LOOKBACK_DAYS),
+        bigquery.ArrayQueryParameter("stock_symbols", "STRING", config.STOCK_SYMBOLS)
+    ])
+    return bq_client.query(query, job_config=job_config).to_dataframe()
+
+
+def sentiment_price_history_from_snapshots(session_id, base_dir=None):
+    """
+    The same frame as fetch_sentiment_price_history(), built from the local session snapshots inside the
+    lookback window instead of BigQuery. Returns None unless every session date in the window has a
+    snapshot, since a partial local history (e.g. on a fresh host) would silently starve the correlations.
+    """
+    end_date = datetime.datetime.strptime(session_id, '%Y-%m-%d').date()
+    start_date = end_date - datetime.timedelta(days=config.NEWS_PRICE_CORRELATION_LOOKBACK_DAYS)
+    session_ids = [(start_date + datetime.timedelta(days=d)).isoformat()
+                   for d in range((end_date - start_date).days + 1)]
+    available = set(list_snapshot_sessions(base_dir))
+    missing = [s for s in session_ids if s not in available]
+    if missing:
+        logger.info(f"[{session_id}] Local snapshots cover {len(session_ids) - len(missing)}/{len(session_ids)} "
+                    f"sessions of the correlation lookback window (first missing: {missing[0]}).")
+        return None
+
+    news = scan_snapshots("news", session_ids, base_dir)
+    mentions = []
+    if "mentioned_symbols" in news.column_names:
+        news = news.select(["published_at", "sentiment_score", "mentioned_symbols"])
+        news = news.filter(pc.is_valid(news.column("sentiment_score")))
+        for batch in news.to_batches():
+            # One row per (article, symbol) match, like UNNEST(mentioned_symbols)
+            symbols = batch.column("mentioned_symbols")
+            parents = pc.list_parent_indices(symbols)
+            mentions.append(pa.table({
+                "symbol": pc.list_flatten(symbols),
+                "published_at": pc.take(batch.column("published_at"), parents),
+                "sentiment_score": pc.take(batch.column("sentiment_score"), parents),
+            }))
+    daily_sentiment = pd.DataFrame(columns=['symbol', 'date', 'avg_sentiment', 'article_count'])
+    if mentions:
+        mentions_df = pa.concat_tables(mentions).to_pandas()
+        mentions_df['date'] = mentions_df['published_at'].dt.date
+        mentions_df = mentions_df[(mentions_df['date'] >= start_date) & (mentions_df['date'] <= end_date)]
+        if not mentions_df.empty:
+            daily_sentiment = mentions_df.groupby(['symbol', 'date'], as_index=False).agg(
+                avg_sentiment=('sentiment_score', 'mean'), article_count=('sentiment_score', 'size'))
+
+    changes = scan_snapshots("financials", session_ids, base_dir).select(["symbol", "date", "daily_change_pct"])
+    changes_df = changes.to_pandas().dropna(subset=['daily_change_pct'])
+    changes_df = changes_df[changes_df['symbol'].isin(config.STOCK_SYMBOLS)
+                            & (changes_df['date'] >= start_date) & (changes_df['date'] <= end_date)]
+    # Each session stores the latest market day, so the same (symbol, date) can appear in several sessions
+    changes_df = changes_df.drop_duplicates(subset=['symbol', 'date'])
+
+    history_df = changes_df.merge(daily_sentiment, on=['symbol', 'date'], how='left')
+    history_df['article_count'] = history_df['article_count'].fillna(0).astype(int)
+    return history_df.sort_values(['symbol', 'date']).reset_index(drop=True)[
+        ['symbol', 'date', 'daily_change_pct', 'avg_sentiment', 'article_count']]
+
+
+def compute_lagged_correlations(history_df, max_lag=None, min_observations=None):
+    """
+    Pearson correlation between daily_change_pct and the average sentiment `lag` market days earlier.
+    Returns { "AAPL": {0: 0.41, 1: 0.12, ...} }, with None where there are too few paired days.
+    """
+    max_lag = config.NEWS_PRICE_CORRELATION_MAX_LAG_DAYS if max_lag is None else max_lag
+    min_observations = config.NEWS_PRICE_CORRELATION_MIN_OBSERVATIONS if min_observations is None else min_observations
+
+    correlations = {}
+    if history_df.empty:
+        return correlations
+
+    for symbol, group in history_df.sort_values(['symbol', 'date']).groupby('symbol'):
+        change = group['daily_change_pct'].astype(float).reset_index(drop=True)
+        sentiment = group['avg_sentiment'].astype(float).reset_index(drop=True)
+        by_lag = {}
+        for lag in range(max_lag + 1):
+            paired = pd.DataFrame({'sentiment': sentiment.shift(lag), 'change': change}).dropna()
+            if len(paired) < min_observations or paired['sentiment'].nunique() < 2 or paired['change'].nunique() < 2:
+                by_lag[lag] = None
+            else:
+                by_lag[lag] = float(paired['sentiment'].corr(paired['change']))
+        correlations[symbol] = by_lag
+    return correlations
+
+
+def rank_news_driving_moves(session_id, anomalies, symbol_article_index, articles, max_articles=None):
+    """
+    Ranks the articles mentioning each anomalous symbol by how strongly their sentiment points in the
+    direction of the move and returns { "AAPL": [article, ...] }. `articles` is an iterable of article dicts
+    (article_id, title, url, sentiment_label, sentiment_score) restricted to news_driving_move_article_ids().
+    The matches stream through one bounded min-heap per symbol instead of being materialized.
+    """
+    max_articles = config.NEWS_DRIVING_MOVE_MAX_ARTICLES if max_articles is None else max_articles
+
+    symbols_by_id = {}
+    for anomaly in anomalies:
+        for article_id in symbol_article_index.get(anomaly['symbol'], []):
+            symbols_by_id.setdefault(article_id, []).append(anomaly['symbol'])
+    direction = {a['symbol']: 1.0 if (a.get('daily_change_pct') or 0.0) >= 0 else -1.0 for a in anomalies}
+    heaps = {a['symbol']: [] for a in anomalies}
+    matched_count = 0
+    for article in articles:
+        matched_count += 1
+        for symbol in symbols_by_id.get(article['article_id'], []):
+            entry = ((article.get('sentiment_score') or 0.0) * direction[symbol], article['article_id'], article)
+            if len(heaps[symbol]) < max_articles:
+                heapq.heappush(heaps[symbol], entry)
+            elif max_articles:
+                heapq.heappushpop(heaps[symbol], entry)
+
+    logger.info(f"[{session_id}] Linked {matched_count} articles to {len(anomalies)} financial anomalies.")
+    return {symbol: [article for _, _, article in sorted(heap, key=lambda e: e[:2], reverse=True)]
+            for symbol, heap in heaps.items()}
+
+
+def news_driving_move_article_ids(anomalies, symbol_article_index):
+    """The article IDs to fetch for rank_news_driving_moves(); only these, so cost follows the matches."""
+    return sorted({article_id for a in anomalies for article_id in symbol_article_index.get(a['symbol'], [])})
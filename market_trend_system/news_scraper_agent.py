@@ -8,6 +8,7 @@ import time
 import logging
 from google.cloud import storage
 from . import config  # Use relative import if part of a package
+from .feed_scheduler import FeedPollScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +18,7 @@ class NewsScraperAgent(adk.Agent):
         super().__init__()
         self.gcs_client = storage.Client()
         self.bucket = self.gcs_client.bucket(config.GCS_BUCKET_NAME)
+        self.scheduler = FeedPollScheduler(self.bucket)
         self.register_event_handler(config.EVENT_START_DAILY_JOB, self.handle_start_scraping)
 
     def handle_start_scraping(self, event_name, event_data):
@@ -24,11 +26,28 @@ class NewsScraperAgent(adk.Agent):
         logger.info(f"[{session_id}] NewsScraperAgent: Received {event_name}, starting scrape.")
 
         articles_scraped_count = 0
-        for feed_name, feed_url in config.NEWS_RSS_FEEDS.items():
+        now = time.time()
+        due_feeds = self.scheduler.due_feeds(config.NEWS_RSS_FEEDS, now)
+        skipped = sorted(set(config.NEWS_RSS_FEEDS) - set(due_feeds))
+        if skipped:
+            logger.info(f"[{session_id}] Skipping feeds not due for a poll yet: {', '.join(skipped)}")
+
+        for feed_name, feed_url in due_feeds.items():
             logger.info(f"[{session_id}] Scraping {feed_name} from {feed_url}")
             try:
-                feed = feedparser.parse(feed_url)
-                for entry in feed.entries:
+                # Conditional GET: unchanged feeds answer 304 with no entries
+                feed = feedparser.parse(feed_url, **self.scheduler.conditional_request_args(feed_name))
+                http_status = getattr(feed, 'status', None)
+                if (http_status is not None and http_status >= 400) or (feed.bozo and not feed.entries
+                                                                        and http_status != 304):
+                    logger.warning(f"[{session_id}] Could not fetch {feed_name} (HTTP {http_status}): "
+                                   f"{getattr(feed, 'bozo_exception', None)}")
+                    self.scheduler.record_failure(feed_name, now, http_status)
+                    continue
+
+                # Busy feeds are polled more often than they rotate: only emit entries not published before
+                new_entries = [entry for entry in feed.entries if self.scheduler.is_new_entry(feed_name, entry)]
+                for entry in new_entries:
                     article_id = str(uuid.uuid4())
 
                     published_parsed = None
@@ -63,11 +82,18 @@ class NewsScraperAgent(adk.Agent):
                         **article_data  # unpack article data into the event
                     }
                     self.publish(config.EVENT_NEWS_ARTICLE_RAW, raw_event_data)
+                    self.scheduler.mark_entry_seen(feed_name, entry)
                     articles_scraped_count += 1
                     logger.debug(f"[{session_id}] Scraped and published: {article_data.get('title')[:50]}...")
-                logger.info(f"[{session_id}] Finished scraping {feed_name}. Found {len(feed.entries)} entries.")
+                # Only now, with every entry stored and published, keep the validators for the next conditional GET
+                self.scheduler.record_success(feed_name, feed, now)
+                logger.info(f"[{session_id}] Finished scraping {feed_name}. Found {len(feed.entries)} entries, "
+                            f"{len(new_entries)} new.")
             except Exception as e:
                 logger.error(f"[{session_id}] Error scraping {feed_name}: {e}", exc_info=True)
+                self.scheduler.record_failure(feed_name, now)
+
+        self.scheduler.save()
 
         logger.info(f"[{session_id}] NewsScraperAgent: Finished all scraping. Total articles: {articles_scraped_count}")
         self.publish(config.EVENT_ALL_RAW_NEWS_GATHERED, {"session_id": session_id, "count": articles_scraped_count})
\ No newline at end of file
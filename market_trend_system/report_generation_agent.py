@@ -8,7 +8,18 @@ import datetime
 import matplotlib.pyplot as plt
 import io
 import base64
+import itertools
+import json
+import math
+import tempfile
 from . import config
+from .news_price_correlation import (
+    compute_lagged_correlations, fetch_sentiment_price_history, news_driving_move_article_ids,
+    rank_news_driving_moves, sentiment_price_history_from_snapshots
+)
+from .report_publisher import ReportPublisher
+from .report_sources import BigQueryReportSource, SnapshotReportSource
+from .session_snapshot import SessionSnapshot, write_session_snapshot
 import os
 
 logger = logging.getLogger(__name__)
@@ -17,9 +28,10 @@ logger = logging.getLogger(__name__)
 class ReportGenerationAgent(adk.Agent):
     def __init__(self):
         super().__init__()
-        self.bq_client = bigquery.Client(project=config.BQ_PROJECT_ID)
+        self._bq_client = None
         self.gcs_client = storage.Client()
         self.gcs_bucket = self.gcs_client.bucket(config.GCS_BUCKET_NAME)
+        self.publisher = ReportPublisher(self.gcs_bucket)
 
         # Setup Jinja2 environment
         template_loader = jinja2.FileSystemLoader(searchpath=os.path.join(os.path.dirname(__file__), "templates"))
@@ -27,6 +39,13 @@ class ReportGenerationAgent(adk.Agent):
 
         self.register_event_handler(config.EVENT_TRENDS_IDENTIFIED_FOR_SESSION, self.handle_trends_identified)
 
+    @property
+    def bq_client(self):
+        # Created on first use: regenerating a report from local snapshots never touches BigQuery
+        if self._bq_client is None:
+            self._bq_client = bigquery.Client(project=config.BQ_PROJECT_ID)
+        return self._bq_client
+
     def _generate_sentiment_chart_b64(self, sentiment_summary_df):
         if sentiment_summary_df.empty:
             return None
@@ -47,66 +66,240 @@ class ReportGenerationAgent(adk.Agent):
             logger.error(f"Error generating sentiment chart: {e}", exc_info=True)
             return None
 
+    def _open_report_source(self, session_id, refresh_snapshot):
+        """
+        Prefers a local columnar snapshot of the session, writing it first when asked to (or when missing).
+        Falls back to querying BigQuery directly if the snapshot cannot be written or read.
+        """
+        try:
+            if refresh_snapshot or not SessionSnapshot.exists(session_id):
+                write_session_snapshot(self.bq_client, session_id)
+            return SnapshotReportSource(SessionSnapshot(session_id))
+        except Exception as e:
+            logger.error(f"[{session_id}] Session snapshot unavailable, reading report data from BigQuery: {e}",
+                         exc_info=True)
+            return BigQueryReportSource(self.bq_client, session_id)
+
+    def _attach_news_driving_moves(self, session_id, anomalies, symbol_article_index, source):
+        for anomaly in anomalies:
+            anomaly["driving_articles"] = []
+            anomaly["sentiment_correlations"] = {}
+        if not anomalies:
+            return
+        try:
+            article_ids = news_driving_move_article_ids(anomalies, symbol_article_index)
+            articles = source.articles_by_ids(article_ids) if article_ids else []
+            driving = rank_news_driving_moves(session_id, anomalies, symbol_article_index, articles)
+            # Correlations need the multi-session history: local snapshots when they cover the whole
+            # lookback window, else BigQuery
+            history_df = sentiment_price_history_from_snapshots(session_id)
+            if history_df is not None:
+                logger.info(f"[{session_id}] Sentiment/price history read from local session snapshots.")
+            else:
+                logger.info(f"[{session_id}] Sentiment/price history read from BigQuery.")
+                history_df = fetch_sentiment_price_history(self.bq_client, session_id)
+            correlations = compute_lagged_correlations(history_df)
+            for anomaly in anomalies:
+                anomaly["driving_articles"] = _json_safe(driving.get(anomaly["symbol"], []))
+                anomaly["sentiment_correlations"] = correlations.get(anomaly["symbol"], {})
+        except Exception as e:
+            # The core report is still useful without this section
+            logger.error(f"[{session_id}] Error joining news to price moves: {e}", exc_info=True)
+
+    def _report_path(self, filename):
+        return f"{config.REPORTS_GCS_PATH_PREFIX}/{filename}"
+
+    def _publish_article_pages(self, session_id, source):
+        """
+        Renders and publishes one HTML page of ranked articles at a time, so only a single page of rows
+        is held in memory. Returns (filenames, changed_filenames).
+        """
+        page_size = config.REPORT_ARTICLES_PER_PAGE
+        total, articles = source.ranked_articles(page_size)
+        num_pages = max(1, math.ceil(total / page_size))
+        filenames = [f"{session_id}_articles_page_{page}.html" for page in range(1, num_pages + 1)]
+        template = self.jinja_env.get_template("articles_page_template.html")
+        changed = []
+        for page, filename in enumerate(filenames, start=1):
+            page_html = template.render(
+                session_id=session_id,
+                articles=_json_safe(list(itertools.islice(articles, page_size))),
+                page=page,
+                num_pages=num_pages,
+                first_rank=(page - 1) * page_size + 1,
+                prev_page=filenames[page - 2] if page > 1 else None,
+                next_page=filenames[page] if page < num_pages else None,
+                report_filename=f"{session_id}_market_trend_report.html")
+            if self.publisher.publish(self._report_path(filename), page_html, "text/html")[1]:
+                changed.append(filename)
+
+        # A session that shrank since its last run leaves pages beyond num_pages behind
+        stale_paths = self.publisher.delete_stale(self._report_path(f"{session_id}_articles_page_"),
+                                                  [self._report_path(filename) for filename in filenames])
+        if stale_paths:
+            logger.info(f"[{session_id}] Deleted {len(stale_paths)} stale article pages: {stale_paths}")
+            changed.extend(os.path.basename(path) for path in stale_paths)
+        return filenames, changed
+
+    def _publish_parquet_extract(self, source, name, filename):
+        """Writes an extract to a temp file and publishes it. Returns True if the published object changed."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            local_path = os.path.join(tmp_dir, filename)
+            source.write_extract(name, local_path)
+            return self.publisher.publish_file(self._report_path(filename), local_path, "application/octet-stream")[1]
+
+    def _build_summary(self, session_id, report_data, article_count, files):
+        # No generation timestamp: the summary must hash identically when nothing changed
+        return _json_safe({
+            "session_id": session_id,
+            "article_count": article_count,
+            "sentiment_summary": report_data["sentiment_summary"],
+            "top_articles": [
+                {k: a.get(k) for k in ("title", "url", "sentiment_label", "sentiment_score")}
+                for a in report_data["top_articles"]
+            ],
+            "financial_anomalies": [
+                {
+                    "symbol": a["symbol"],
+                    "daily_change_pct": a["daily_change_pct"],
+                    "driving_articles": [{"title": d.get("title"), "url": d.get("url")}
+                                         for d in a.get("driving_articles", [])],
+                }
+                for a in report_data["financial_anomalies"]
+            ],
+            "files": files,
+        })
+
+    def _update_index(self, session_id, summary):
+        """
+        Upserts this session into the multi-day index. Returns ({ filename: (content, content_type) }, is_latest),
+        where is_latest tells whether this is the newest session in the index.
+        """
+        index_path = self._report_path("index.json")
+        try:
+            index = self.publisher.read_json(index_path, default={"sessions": []})
+            sessions = {entry["session_id"]: entry for entry in index["sessions"]}
+        except Exception as e:
+            # The report itself is already published; don't let a bad index block the rest
+            logger.error(f"[{session_id}] Could not read {index_path}, rebuilding the index from scratch: {e}",
+                         exc_info=True)
+            sessions = {}
+        sessions[session_id] = {
+            "session_id": session_id,
+            "article_count": summary["article_count"],
+            "sentiment_summary": summary["sentiment_summary"],
+            "anomaly_symbols": [a["symbol"] for a in summary["financial_anomalies"]],
+            "report": summary["files"]["html"],
+            "summary": summary["files"]["summary"],
+        }
+        index = {"sessions": sorted(sessions.values(), key=lambda e: e["session_id"], reverse=True)}
+        index_html = self.jinja_env.get_template("index_template.html").render(index)
+        return {
+            "index.json": (json.dumps(index, indent=2, sort_keys=True), "application/json"),
+            "index.html": (index_html, "text/html"),
+        }, index["sessions"][0]["session_id"] == session_id
+
     def handle_trends_identified(self, event_name, event_data):
         session_id = event_data["session_id"]
         logger.info(f"[{session_id}] Received trends identified. Generating report.")
+        self.generate_report(session_id, event_data.get("symbol_article_index"), refresh_snapshot=True)
 
+    def regenerate_report(self, session_id):
+        """
+        Re-renders and republishes a past session's report from its local snapshot when one exists.
+        Downstream pipeline consumers are not notified.
+        """
+        logger.info(f"[{session_id}] Regenerating report.")
+        self.generate_report(session_id, refresh_snapshot=False, publish_event=False)
+
+    def generate_report(self, session_id, symbol_article_index=None, refresh_snapshot=True, publish_event=True):
         report_data = {"session_id": session_id}
 
         try:
-            # 1. Fetch News Data and Sentiment Summary
-            news_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
-            news_query = f"""
-                SELECT title, url, summary_cleaned, sentiment_label, sentiment_score
-                FROM `{news_table}`
-                WHERE session_id = @session_id
-                ORDER BY sentiment_score DESC NULLS LAST
-            """  # Order by score to get top articles easily
-            news_query_params = [bigquery.ScalarQueryParameter("session_id", "STRING", session_id)]
-            news_job_config = bigquery.QueryJobConfig(query_parameters=news_query_params)
-            news_df = self.bq_client.query(news_query, job_config=news_job_config).to_dataframe()
-
-            if not news_df.empty:
-                report_data["top_articles"] = news_df.head(5).to_dict('records')
-                sentiment_counts = news_df['sentiment_label'].value_counts().reset_index()
-                sentiment_counts.columns = ['sentiment_label', 'count']
-                report_data["sentiment_summary"] = sentiment_counts.set_index('sentiment_label')['count'].to_dict()
+            # 0. Snapshot the completed session locally; everything below reads from it when available
+            source = self._open_report_source(session_id, refresh_snapshot)
+            if symbol_article_index is None:
+                symbol_article_index = source.symbol_article_index()
+
+            # 1. Sentiment Summary and Top Articles (aggregated without materializing the session)
+            article_count, sentiment_counts = source.sentiment_counts()
+            report_data["top_articles"] = _json_safe(source.top_articles(config.REPORT_TOP_ARTICLES)) \
+                if article_count else []
+
+            if not sentiment_counts.empty:
+                report_data["sentiment_summary"] = _json_safe(
+                    sentiment_counts.set_index('sentiment_label')['count'].to_dict())
                 report_data["sentiment_chart_b64"] = self._generate_sentiment_chart_b64(sentiment_counts)
             else:
-                report_data["top_articles"] = []
                 report_data["sentiment_summary"] = {'positive': 0, 'negative': 0, 'neutral': 0}
                 report_data["sentiment_chart_b64"] = None
 
             # 2. Fetch Financial Anomalies
-            financial_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_FINANCIALS}"
-            financial_query = f"""
-                SELECT symbol, daily_change_pct
-                FROM `{financial_table}`
-                WHERE session_id = @session_id AND is_anomaly = TRUE
-            """
-            financial_query_params = [bigquery.ScalarQueryParameter("session_id", "STRING", session_id)]
-            financial_job_config = bigquery.QueryJobConfig(query_parameters=financial_query_params)
-            anomalies_df = self.bq_client.query(financial_query, job_config=financial_job_config).to_dataframe()
-
-            report_data["financial_anomalies"] = anomalies_df.to_dict('records') if not anomalies_df.empty else []
-
-            # 3. Render HTML Report
-            template = self.jinja_env.get_template("report_template.html")
-            html_report = template.render(report_data)
+            report_data["financial_anomalies"] = _json_safe(source.anomalies())
+
+            # 3. Join anomalies to the news driving them, plus lagged sentiment/price correlations from history
+            self._attach_news_driving_moves(session_id, report_data["financial_anomalies"], symbol_article_index,
+                                            source)
 
-            # 4. Save report to GCS
+            # 4. Stream paged HTML and Parquet extracts to GCS (only changed objects are uploaded)
             report_filename = f"{session_id}_market_trend_report.html"
-            gcs_report_path = f"{config.REPORTS_GCS_PATH_PREFIX}/{report_filename}"
-            blob = self.gcs_bucket.blob(gcs_report_path)
-            blob.upload_from_string(html_report, content_type='text/html')
-            full_gcs_path = f"gs://{config.GCS_BUCKET_NAME}/{gcs_report_path}"
-            logger.info(f"[{session_id}] Report generated and saved to {full_gcs_path}")
-
-            # 5. Publish report_generated event
-            self.publish(config.EVENT_REPORT_GENERATED, {
-                "session_id": session_id,
-                "gcs_report_path": full_gcs_path
-            })
+            page_filenames, changed = self._publish_article_pages(session_id, source)
+            files = {
+                "html": report_filename,
+                "article_pages": page_filenames,
+                "articles_parquet": f"{session_id}_articles.parquet",
+                "anomalies_parquet": f"{session_id}_anomalies.parquet",
+                "summary": f"{session_id}_summary.json",
+            }
+            report_data["files"] = files
+
+            for name, filename in (("articles", files["articles_parquet"]), ("anomalies", files["anomalies_parquet"])):
+                if self._publish_parquet_extract(source, name, filename):
+                    changed.append(filename)
+
+            # 5. Render the report, compact JSON summary and multi-day index, and publish the changed ones
+            template = self.jinja_env.get_template("report_template.html")
+            outputs = {report_filename: (template.render(config=config, **report_data), "text/html")}
+            summary = self._build_summary(session_id, report_data, article_count, files)
+            summary_json = json.dumps(summary, indent=2, sort_keys=True)
+            outputs[files["summary"]] = (summary_json, "application/json")
+            index_outputs, is_latest = self._update_index(session_id, summary)
+            if is_latest:  # Small file for dashboards to poll; an older session must never replace it
+                outputs["latest_summary.json"] = (summary_json, "application/json")
+            outputs.update(index_outputs)
+
+            for filename, (content, content_type) in outputs.items():
+                if self.publisher.publish(self._report_path(filename), content, content_type)[1]:
+                    changed.append(filename)
+            full_gcs_path = self.publisher.gcs_uri(self._report_path(report_filename))
+            logger.info(f"[{session_id}] Report generated at {full_gcs_path}; "
+                        f"{len(changed)} outputs changed and were uploaded.")
+
+            # 6. Publish report_generated event
+            if publish_event:
+                self.publish(config.EVENT_REPORT_GENERATED, {
+                    "session_id": session_id,
+                    "gcs_report_path": full_gcs_path,
+                    "gcs_summary_path": self.publisher.gcs_uri(self._report_path(files["summary"])),
+                    "changed_outputs": changed
+                })
 
         except Exception as e:
-            logger.error(f"[{session_id}] Error generating report: {e}", exc_info=True)
\ No newline at end of file
+            logger.error(f"[{session_id}] Error generating report: {e}", exc_info=True)
+
+
+def _json_safe(value):
+    """Converts DataFrame records to plain JSON types (NaN -> None, numpy -> Python, datetimes -> ISO)."""
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if value is pd.NaT:
+        return None
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, 'tolist'):  # numpy scalars and arrays
+        return _json_safe(value.tolist())
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
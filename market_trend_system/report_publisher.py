@@ -0,0 +1,77 @@
+# report_publisher.py
+import base64
+import hashlib
+import json
+import logging
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+class ReportPublisher:
+    """
+    Uploads report outputs to GCS only when their content changed. The comparison uses the MD5 that GCS
+    already keeps for every object, so an unchanged output costs one metadata lookup and no upload.
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self._known_hashes = {}  # { "gcs_path": base64 md5 } for objects this process has seen or written
+
+    @staticmethod
+    def content_hash(content):
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        return base64.b64encode(hashlib.md5(content).digest()).decode("ascii")
+
+    def gcs_uri(self, gcs_path):
+        return f"gs://{config.GCS_BUCKET_NAME}/{gcs_path}"
+
+    def _remote_hash(self, gcs_path):
+        if gcs_path not in self._known_hashes:
+            blob = self.bucket.get_blob(gcs_path)
+            self._known_hashes[gcs_path] = blob.md5_hash if blob is not None else None
+        return self._known_hashes[gcs_path]
+
+    def publish(self, gcs_path, content, content_type):
+        """Returns (gcs_uri, changed)."""
+        new_hash = self.content_hash(content)
+        if self._remote_hash(gcs_path) == new_hash:
+            logger.debug(f"Unchanged, skipping upload: {gcs_path}")
+            return self.gcs_uri(gcs_path), False
+        self.bucket.blob(gcs_path).upload_from_string(content, content_type=content_type)
+        self._known_hashes[gcs_path] = new_hash
+        return self.gcs_uri(gcs_path), True
+
+    def publish_file(self, gcs_path, local_path, content_type):
+        """Like publish(), for outputs written to disk; the file is hashed in chunks rather than loaded."""
+        md5 = hashlib.md5()
+        with open(local_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+        new_hash = base64.b64encode(md5.digest()).decode("ascii")
+        if self._remote_hash(gcs_path) == new_hash:
+            logger.debug(f"Unchanged, skipping upload: {gcs_path}")
+            return self.gcs_uri(gcs_path), False
+        self.bucket.blob(gcs_path).upload_from_filename(local_path, content_type=content_type)
+        self._known_hashes[gcs_path] = new_hash
+        return self.gcs_uri(gcs_path), True
+
+    def delete_stale(self, prefix, keep_paths):
+        """Deletes the objects under prefix that are not in keep_paths. Returns the deleted paths."""
+        keep_paths = set(keep_paths)
+        deleted = []
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            if blob.name not in keep_paths:
+                blob.delete()
+                self._known_hashes.pop(blob.name, None)
+                deleted.append(blob.name)
+        return deleted
+
+    def read_json(self, gcs_path, default=None):
+        blob = self.bucket.get_blob(gcs_path)
+        if blob is None:
+            return default
+        content = blob.download_as_bytes()
+        self._known_hashes[gcs_path] = self.content_hash(content)
+        return json.loads(content)
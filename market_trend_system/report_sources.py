@@ -0,0 +1,198 @@
+# report_sources.py
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from google.cloud import bigquery
+from . import config
+
+# Columns shared by both sources, so reports rendered from either are identical
+RANKED_ARTICLE_COLUMNS = ["title", "url", "summary_cleaned", "published_at", "feed_source",
+                          "sentiment_label", "sentiment_score"]
+TOP_ARTICLE_COLUMNS = ["title", "url", "summary_cleaned", "sentiment_label", "sentiment_score"]
+DRIVING_ARTICLE_COLUMNS = ["article_id", "title", "url", "sentiment_label", "sentiment_score"]
+ARTICLE_EXTRACT_COLUMNS = ["article_id", "title", "url", "summary_cleaned", "published_at", "feed_source",
+                           "sentiment_label", "sentiment_score", "mentioned_symbols"]
+ANOMALY_COLUMNS = ["symbol", "date", "close_price", "daily_change_pct"]
+
+
+class BigQueryReportSource:
+    """Report data queried from BigQuery, with aggregation and top-K pushed down into the queries."""
+
+    def __init__(self, bq_client, session_id):
+        self.bq_client = bq_client
+        self.session_id = session_id
+        self.news_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
+        self.financial_table = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_FINANCIALS}"
+
+    def _query(self, sql, extra_params=()):
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("session_id", "STRING", self.session_id), *extra_params
+        ])
+        return self.bq_client.query(sql, job_config=job_config)
+
+    def sentiment_counts(self):
+        """Returns (article_count, DataFrame[sentiment_label, count]) with unscored articles left out of the frame."""
+        label_counts_df = self._query(f"""
+            SELECT sentiment_label, COUNT(*) AS count
+            FROM `{self.news_table}`
+            WHERE session_id = @session_id
+            GROUP BY sentiment_label
+            ORDER BY sentiment_label
+        """).to_dataframe()
+        article_count = int(label_counts_df['count'].sum()) if not label_counts_df.empty else 0
+        return article_count, label_counts_df.dropna(subset=['sentiment_label'])
+
+    def top_articles(self, k):
+        rows = self._query(f"""
+            SELECT {", ".join(TOP_ARTICLE_COLUMNS)}
+            FROM `{self.news_table}`
+            WHERE session_id = @session_id
+            ORDER BY sentiment_score DESC NULLS LAST, article_id
+            LIMIT @top_k
+        """, [bigquery.ScalarQueryParameter("top_k", "INT64", k)])
+        return [dict(row.items()) for row in rows]
+
+    def ranked_articles(self, page_size):
+        """Returns (total, iterator of article dicts) ordered by sentiment; rows are fetched page by page."""
+        rows = self._query(f"""
+            SELECT {", ".join(RANKED_ARTICLE_COLUMNS)}
+            FROM `{self.news_table}`
+            WHERE session_id = @session_id
+            ORDER BY sentiment_score DESC NULLS LAST, article_id
+        """).result(page_size=page_size)  # article_id keeps pages stable between runs
+        return rows.total_rows, (dict(row.items()) for row in rows)
+
+    def anomalies(self):
+        # One row per anomalous symbol at most
+        rows = self._query(f"""
+            SELECT {", ".join(ANOMALY_COLUMNS)}
+            FROM `{self.financial_table}`
+            WHERE session_id = @session_id AND is_anomaly = TRUE
+            ORDER BY symbol
+        """)
+        return [dict(row.items()) for row in rows]
+
+    def articles_by_ids(self, article_ids):
+        rows = self._query(f"""
+            SELECT {", ".join(DRIVING_ARTICLE_COLUMNS)}
+            FROM `{self.news_table}`
+            WHERE session_id = @session_id AND article_id IN UNNEST(@article_ids)
+        """, [bigquery.ArrayQueryParameter("article_ids", "STRING", article_ids)])
+        return (dict(row.items()) for row in rows)
+
+    def symbol_article_index(self):
+        rows = self._query(f"""
+            SELECT symbol, ARRAY_AGG(article_id ORDER BY article_id) AS article_ids
+            FROM `{self.news_table}`, UNNEST(mentioned_symbols) AS symbol
+            WHERE session_id = @session_id
+            GROUP BY symbol
+        """)
+        return {row.symbol: list(row.article_ids) for row in rows}
+
+    def write_extract(self, name, local_path):
+        """
+        Writes the "articles" or "anomalies" extract to Parquet by streaming Arrow record batches,
+        keeping memory bounded by config.REPORT_EXTRACT_BATCH_ROWS.
+        """
+        if name == "articles":
+            sql = f"""
+                SELECT {", ".join(ARTICLE_EXTRACT_COLUMNS)}
+                FROM `{self.news_table}`
+                WHERE session_id = @session_id
+                ORDER BY article_id
+            """
+        else:
+            sql = f"""
+                SELECT {", ".join(ANOMALY_COLUMNS)}
+                FROM `{self.financial_table}`
+                WHERE session_id = @session_id AND is_anomaly = TRUE
+                ORDER BY symbol
+            """
+        query_job = self._query(sql)
+        writer = None
+        try:
+            for batch in query_job.result(page_size=config.REPORT_EXTRACT_BATCH_ROWS).to_arrow_iterable():
+                if writer is None:
+                    writer = pq.ParquetWriter(local_path, batch.schema)
+                writer.write_batch(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:  # No rows: still write an empty extract carrying the schema
+            pq.write_table(query_job.result().to_arrow(), local_path)
+
+
+class SnapshotReportSource:
+    """
+    Report data read from a local SessionSnapshot. The tables are memory-mapped Arrow, so rows are only
+    materialized as Python objects a page (or a handful of matches) at a time.
+    """
+
+    def __init__(self, snapshot):
+        self.news = snapshot.table("news")
+        self.financials = snapshot.table("financials")
+        self._ranked_indices = None
+
+    def _ranking(self):
+        if self._ranked_indices is None:
+            # Nulls sort last by default, matching the BigQuery source's NULLS LAST
+            self._ranked_indices = pc.sort_indices(
+                self.news, sort_keys=[("sentiment_score", "descending"), ("article_id", "ascending")])
+        return self._ranked_indices
+
+    def _rows(self, table, columns):
+        return table.select(columns).to_pylist()
+
+    def sentiment_counts(self):
+        # Counted on the dictionary-encoded column directly: only the distinct labels are ever decoded
+        counts = pc.value_counts(self.news.column("sentiment_label"))
+        label_counts_df = pd.DataFrame({
+            'sentiment_label': counts.field('values').to_pylist(),
+            'count': counts.field('counts').to_pylist(),
+        }, columns=['sentiment_label', 'count']).dropna(subset=['sentiment_label'])
+        return self.news.num_rows, label_counts_df.sort_values('sentiment_label').reset_index(drop=True)
+
+    def top_articles(self, k):
+        return self._rows(self.news.take(self._ranking()[:k]), TOP_ARTICLE_COLUMNS)
+
+    def ranked_articles(self, page_size):
+        indices = self._ranking()
+
+        def pages():
+            for start in range(0, len(indices), page_size):
+                yield from self._rows(self.news.take(indices[start:start + page_size]), RANKED_ARTICLE_COLUMNS)
+
+        return self.news.num_rows, pages()
+
+    def _anomaly_table(self):
+        anomalies = self.financials.filter(pc.equal(self.financials.column("is_anomaly"), True))
+        return anomalies.select(ANOMALY_COLUMNS).sort_by("symbol")
+
+    def anomalies(self):
+        return self._anomaly_table().to_pylist()
+
+    def articles_by_ids(self, article_ids):
+        mask = pc.is_in(self.news.column("article_id"), value_set=pa.array(article_ids, type=pa.string()))
+        return iter(self._rows(self.news.filter(mask), DRIVING_ARTICLE_COLUMNS))
+
+    def symbol_article_index(self):
+        if "mentioned_symbols" not in self.news.column_names:
+            return {}
+        index = {}
+        for chunk_ids, chunk_symbols in zip(self.news.column("article_id").chunks,
+                                            self.news.column("mentioned_symbols").chunks):
+            # Only (article, symbol) matches are turned into Python objects
+            parents = pc.list_parent_indices(chunk_symbols)
+            article_ids = pc.take(chunk_ids, parents).to_pylist()
+            for article_id, symbol in zip(article_ids, pc.list_flatten(chunk_symbols).to_pylist()):
+                index.setdefault(symbol, []).append(article_id)
+        return index
+
+    def write_extract(self, name, local_path):
+        if name == "articles":
+            columns = [c for c in ARTICLE_EXTRACT_COLUMNS if c in self.news.column_names]
+            table = self.news.select(columns)  # Snapshot rows are already ordered by article_id
+        else:
+            table = self._anomaly_table()
+        pq.write_table(table, local_path)
@@ -0,0 +1,176 @@
+# session_snapshot.py
+import datetime
+import hashlib
+import json
+import logging
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+from google.cloud import bigquery
+from . import config
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+
+# Low-cardinality columns stored dictionary-encoded; the dictionary is fetched up front so every batch shares it
+DICTIONARY_COLUMNS = {
+    "news": ("feed_source", "sentiment_label"),
+    "financials": (),
+}
+
+
+def _session_dir(session_id, base_dir=None):
+    return os.path.join(base_dir or config.SNAPSHOT_LOCAL_DIR, session_id)
+
+
+def _file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _dictionary_schema(schema, dictionaries):
+    return pa.schema([pa.field(f.name, pa.dictionary(pa.int32(), pa.string()), f.nullable)
+                      if f.name in dictionaries else f for f in schema])
+
+
+def _dictionary_encode(batch, dictionaries):
+    arrays = []
+    for field, column in zip(batch.schema, batch.columns):
+        if field.name in dictionaries:
+            dictionary = dictionaries[field.name]
+            indices = pc.index_in(column.cast(pa.string()), value_set=dictionary).cast(pa.int32())
+            if indices.null_count != column.null_count:
+                raise ValueError(f"Column {field.name} gained values while the snapshot was being written")
+            column = pa.DictionaryArray.from_arrays(indices, dictionary)
+        arrays.append(column)
+    return pa.RecordBatch.from_arrays(arrays, schema=_dictionary_schema(batch.schema, dictionaries))
+
+
+def _fetch_dictionaries(bq_client, session_id, table_id, columns):
+    if not columns:
+        return {}
+    selects = ", ".join(f"ARRAY_AGG(DISTINCT {c} IGNORE NULLS ORDER BY {c}) AS {c}" for c in columns)
+    query = f"SELECT {selects} FROM `{table_id}` WHERE session_id = @session_id"
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("session_id", "STRING", session_id)
+    ])
+    row = next(iter(bq_client.query(query, job_config=job_config).result()))
+    return {c: pa.array(row[c] or [], type=pa.string()) for c in columns}
+
+
+def _write_table(bq_client, session_id, table_id, order_by, dictionary_columns, path):
+    """Streams one table's session rows from BigQuery into an Arrow IPC file. Returns its manifest entry."""
+    dictionaries = _fetch_dictionaries(bq_client, session_id, table_id, dictionary_columns)
+    query = f"SELECT * FROM `{table_id}` WHERE session_id = @session_id ORDER BY {order_by}"
+    job_config = bigquery.QueryJobConfig(query_parameters=[
+        bigquery.ScalarQueryParameter("session_id", "STRING", session_id)
+    ])
+    query_job = bq_client.query(query, job_config=job_config)
+
+    tmp_path = f"{path}.tmp"
+    num_rows = 0
+    writer = None
+    with pa.OSFile(tmp_path, "wb") as sink:
+        try:
+            for batch in query_job.result(page_size=config.SNAPSHOT_BATCH_ROWS).to_arrow_iterable():
+                batch = _dictionary_encode(batch, dictionaries)
+                if writer is None:
+                    writer = pa.ipc.new_file(sink, batch.schema)
+                writer.write_batch(batch)
+                num_rows += batch.num_rows
+            if writer is None:  # No rows: still write a file carrying the schema
+                writer = pa.ipc.new_file(sink, _dictionary_schema(query_job.result().to_arrow().schema, dictionaries))
+        finally:
+            if writer is not None:
+                writer.close()
+    os.replace(tmp_path, path)  # Readers never see a half-written file
+
+    with pa.memory_map(path, "r") as source:
+        schema = pa.ipc.open_file(source).schema
+    return {
+        "file": os.path.basename(path),
+        "rows": num_rows,
+        "bytes": os.path.getsize(path),
+        "sha256": _file_sha256(path),
+        "schema": [{"name": f.name, "type": str(f.type)} for f in schema],
+        "dictionary_columns": list(dictionary_columns),
+    }
+
+
+def write_session_snapshot(bq_client, session_id, base_dir=None):
+    """
+    Writes the session's processed news and financial rows to <SNAPSHOT_LOCAL_DIR>/<session_id>/ as
+    uncompressed Arrow IPC files (memory-mappable, zero-copy reads) plus a manifest. The manifest is written
+    last, so a snapshot directory without one is incomplete and ignored by readers.
+    """
+    session_dir = _session_dir(session_id, base_dir)
+    os.makedirs(session_dir, exist_ok=True)
+    manifest_path = os.path.join(session_dir, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)  # Invalidate the old snapshot while its files are being replaced
+    sources = {
+        "news": (config.BQ_TABLE_PROCESSED_NEWS, "article_id"),
+        "financials": (config.BQ_TABLE_PROCESSED_FINANCIALS, "symbol, date"),
+    }
+    tables = {}
+    for name, (table_name, order_by) in sources.items():
+        table_id = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{table_name}"
+        tables[name] = _write_table(bq_client, session_id, table_id, order_by, DICTIONARY_COLUMNS[name],
+                                    os.path.join(session_dir, f"{name}.arrow"))
+
+    manifest = {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "format": "arrow-ipc-file",
+        "session_id": session_id,
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "tables": tables,
+    }
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    logger.info(f"[{session_id}] Wrote session snapshot to {session_dir}: "
+                f"{tables['news']['rows']} news rows, {tables['financials']['rows']} financial rows.")
+    return manifest
+
+
+class SessionSnapshot:
+    """Read side of a session snapshot. Tables are memory-mapped, so opening one does not copy it into RAM."""
+
+    def __init__(self, session_id, base_dir=None):
+        self.session_id = session_id
+        self.session_dir = _session_dir(session_id, base_dir)
+        with open(os.path.join(self.session_dir, MANIFEST_FILENAME)) as f:
+            self.manifest = json.load(f)
+        self._tables = {}
+
+    @staticmethod
+    def exists(session_id, base_dir=None):
+        return os.path.exists(os.path.join(_session_dir(session_id, base_dir), MANIFEST_FILENAME))
+
+    def table(self, name):
+        if name not in self._tables:
+            path = os.path.join(self.session_dir, self.manifest["tables"][name]["file"])
+            self._tables[name] = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return self._tables[name]
+
+
+def list_snapshot_sessions(base_dir=None):
+    base_dir = base_dir or config.SNAPSHOT_LOCAL_DIR
+    if not os.path.isdir(base_dir):
+        return []
+    return sorted(name for name in os.listdir(base_dir) if SessionSnapshot.exists(name, base_dir))
+
+
+def scan_snapshots(table_name, session_ids=None, base_dir=None):
+    """Concatenates one table across several (default: all) local session snapshots for ad-hoc analysis."""
+    session_ids = session_ids if session_ids is not None else list_snapshot_sessions(base_dir)
+    tables = [SessionSnapshot(session_id, base_dir).table(table_name) for session_id in session_ids]
+    if not tables:
+        return None
+    # Sessions written before a column was added lack it; promotion fills those with nulls
+    return pa.concat_tables(tables, promote_options="default")
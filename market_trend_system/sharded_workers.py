@@ -0,0 +1,258 @@
+# sharded_workers.py
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from . import config
+
+logger = logging.getLogger(__name__)
+
+
+def shard_for_article(article_id, num_shards):
+    # hash() is salted per process, so use a stable digest to keep routing identical across runs and hosts
+    digest = hashlib.md5(article_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % num_shards
+
+
+class LocalBroker:
+    """
+    Process-local stand-in for a message broker: one task queue per shard and a shared result queue.
+    A networked broker can replace it by exposing the same task_queue(shard)/result_queue objects
+    (picklable, with put() and get(timeout=...)).
+    """
+
+    def __init__(self, num_shards, mp_context=None):
+        self._mp_context = mp_context or multiprocessing.get_context("spawn")
+        self.num_shards = num_shards
+        self._task_queues = [self._mp_context.Queue() for _ in range(num_shards)]
+        self.result_queue = self._mp_context.Queue()
+
+    def task_queue(self, shard):
+        return self._task_queues[shard]
+
+    def reset_task_queue(self, shard):
+        """Replaces a shard's queue, abandoning whatever is left in it (used after its worker died)."""
+        old_queue = self._task_queues[shard]
+        self._task_queues[shard] = self._mp_context.Queue()
+        old_queue.close()
+        old_queue.cancel_join_thread()
+        return self._task_queues[shard]
+
+    def publish_task(self, shard, task):
+        self._task_queues[shard].put(task)
+
+
+def _failed_result(task, error):
+    return {"session_id": task.get("session_id"), "article_id": task.get("article_id"),
+            "mentioned_symbols": [], "ok": False, "error": error}
+
+
+def _flush_batch(bq_client, table_id, shard_index, rows, result_queue):
+    results = [{"session_id": row["session_id"], "article_id": row["article_id"],
+                "mentioned_symbols": row["mentioned_symbols"], "ok": True, "error": None} for row in rows]
+    try:
+        # article_id as insertId lets BigQuery drop the duplicate if a re-queued article is inserted again
+        for error in bq_client.insert_rows_json(table_id, rows, row_ids=[row["article_id"] for row in rows]):
+            results[error["index"]].update(ok=False, error=str(error["errors"]))
+    except Exception as e:
+        for result in results:
+            result.update(ok=False, error=str(e))
+    result_queue.put({"shard": shard_index, "results": results})
+
+
+def _worker_main(shard_index, task_queue, result_queue, batch_size, flush_seconds):
+    # Runs in a spawned process: build clients here, never inherit them from the parent
+    logging.basicConfig(level=logging.INFO,
+                        format=f'%(asctime)s - worker-{shard_index} - %(name)s - %(levelname)s - %(message)s')
+    from google.cloud import bigquery
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+    from .article_processing import build_processed_article, score_sentiment
+    from .symbol_index import SymbolArticleIndex
+
+    bq_client = bigquery.Client(project=config.BQ_PROJECT_ID)
+    analyzer = SentimentIntensityAnalyzer()
+    symbol_matcher = SymbolArticleIndex()
+    table_id = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
+
+    batch = []
+    batch_started = 0.0
+    while True:
+        try:
+            task = task_queue.get(timeout=flush_seconds)
+        except queue.Empty:
+            task = False  # Idle: flush whatever is buffered
+
+        if task is None:  # Shutdown sentinel
+            break
+        if task:
+            try:
+                row = build_processed_article(task, symbol_matcher)
+                row["sentiment_score"], row["sentiment_label"] = score_sentiment(
+                    analyzer, row["title"], row["summary_cleaned"])
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(row)
+            except Exception as e:
+                logger.error(f"[{task.get('session_id')}] Error processing raw news {task.get('article_id')}: {e}",
+                             exc_info=True)
+                result_queue.put({"shard": shard_index, "results": [_failed_result(task, str(e))]})
+
+        # Flush when full, when idle, or when the oldest buffered row has waited flush_seconds
+        if batch and (task is False or len(batch) >= batch_size
+                      or time.monotonic() - batch_started >= flush_seconds):
+            _flush_batch(bq_client, table_id, shard_index, batch, result_queue)
+            batch = []
+
+    if batch:
+        _flush_batch(bq_client, table_id, shard_index, batch, result_queue)
+
+
+class ShardedArticleDispatcher:
+    """
+    Fans raw news events out to worker processes by article_id hash. Workers clean, tag, sentiment-score
+    and batch-insert articles, then report per-article results back through on_results.
+
+    Articles are tracked from dispatch until their result comes back. A worker that dies is restarted on
+    a fresh queue with its unfinished articles re-queued; after max_restarts a shard is given up and its
+    articles are reported as failed immediately rather than left for the completion barrier to time out.
+    """
+
+    def __init__(self, num_workers, on_results, broker=None,
+                 batch_size=config.PIPELINE_WORKER_BATCH_SIZE, flush_seconds=config.PIPELINE_WORKER_FLUSH_SECONDS,
+                 max_restarts=config.PIPELINE_WORKER_MAX_RESTARTS):
+        self.num_workers = num_workers
+        self.on_results = on_results
+        self.broker = broker or LocalBroker(num_workers)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_restarts = max_restarts
+
+        self._mp_context = multiprocessing.get_context("spawn")
+        self._processes = [None] * num_workers
+        self._restarts = [0] * num_workers
+        self._dead_shards = set()
+        # { shard: { (session_id, article_id): [event_data, ...] } } for articles without a result yet
+        self._pending = [{} for _ in range(num_workers)]
+        self._lock = threading.Lock()  # Guards the worker and pending state above
+        self._collector = None
+        self._stopping = threading.Event()
+
+    def _start_worker(self, shard_index):
+        process = self._mp_context.Process(
+            target=_worker_main,
+            args=(shard_index, self.broker.task_queue(shard_index), self.broker.result_queue,
+                  self.batch_size, self.flush_seconds),
+            name=f"pipeline-worker-{shard_index}",
+            daemon=True)
+        process.start()
+        self._processes[shard_index] = process
+
+    def start(self):
+        with self._lock:
+            for shard_index in range(self.num_workers):
+                self._start_worker(shard_index)
+        self._collector = threading.Thread(target=self._collect_results, name="pipeline-collector", daemon=True)
+        self._collector.start()
+        logger.info(f"Started {self.num_workers} pipeline worker processes.")
+
+    def dispatch(self, event_data):
+        shard = shard_for_article(event_data["article_id"], self.num_workers)
+        with self._lock:
+            if shard not in self._dead_shards:
+                key = (event_data["session_id"], event_data["article_id"])
+                self._pending[shard].setdefault(key, []).append(event_data)
+                self.broker.publish_task(shard, event_data)
+                return
+        self.on_results([_failed_result(event_data, f"pipeline-worker-{shard} is down")])
+
+    def _settle_pending(self, shard, results):
+        """Drops results that are not pending (e.g. a late result for an article already re-queued)."""
+        settled = []
+        with self._lock:
+            pending = self._pending[shard]
+            for result in results:
+                key = (result["session_id"], result["article_id"])
+                tasks = pending.get(key)
+                if not tasks:
+                    continue
+                tasks.pop()
+                if not tasks:
+                    del pending[key]
+                settled.append(result)
+        return settled
+
+    def _handle_message(self, message):
+        try:
+            results = self._settle_pending(message["shard"], message["results"])
+            if results:
+                self.on_results(results)
+        except Exception as e:
+            logger.error(f"Error handling results from worker {message.get('shard')}: {e}", exc_info=True)
+
+    def _drain_results(self):
+        while True:
+            try:
+                message = self.broker.result_queue.get(timeout=0.2)
+            except queue.Empty:
+                return
+            self._handle_message(message)
+
+    def _check_workers(self):
+        with self._lock:
+            if self._stopping.is_set() or all(process.is_alive() for shard, process in enumerate(self._processes)
+                                              if shard not in self._dead_shards):
+                return
+        # Settle whatever a dead worker flushed before it died, so those articles are not re-queued
+        self._drain_results()
+        failed = []
+        with self._lock:
+            for shard, process in enumerate(self._processes):
+                if shard in self._dead_shards or process.is_alive() or self._stopping.is_set():
+                    continue
+                # Anything still queued or buffered by the dead worker is redone from the pending list
+                tasks = [task for tasks in self._pending[shard].values() for task in tasks]
+                self.broker.reset_task_queue(shard)
+                if self._restarts[shard] < self.max_restarts:
+                    self._restarts[shard] += 1
+                    logger.error(f"{process.name} died (exit code {process.exitcode}); restarting it "
+                                 f"({self._restarts[shard]}/{self.max_restarts}) with {len(tasks)} unfinished articles.")
+                    self._start_worker(shard)
+                    for task in tasks:
+                        self.broker.publish_task(shard, task)
+                else:
+                    logger.error(f"{process.name} died (exit code {process.exitcode}) after {self.max_restarts} "
+                                 f"restarts; failing its {len(tasks)} unfinished articles and all further ones.")
+                    self._dead_shards.add(shard)
+                    self._pending[shard] = {}
+                    failed.extend(_failed_result(task, f"{process.name} died") for task in tasks)
+        if failed:
+            self.on_results(failed)
+
+    def _collect_results(self):
+        while True:
+            self._check_workers()
+            try:
+                message = self.broker.result_queue.get(timeout=1)
+            except queue.Empty:
+                # Only exit once the workers are gone and their last results have been drained
+                if self._stopping.is_set() and not any(p.is_alive() for p in self._processes):
+                    break
+                continue
+            self._handle_message(message)
+
+    def stop(self, timeout=30):
+        self._stopping.set()
+        with self._lock:
+            for shard_index in range(self.num_workers):
+                if shard_index not in self._dead_shards:
+                    self.broker.publish_task(shard_index, None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not exit in {timeout}s, terminating.")
+                process.terminate()
+        if self._collector:
+            self._collector.join(timeout)
+        logger.info("Pipeline worker processes stopped.")
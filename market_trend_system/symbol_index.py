@@ -0,0 +1,60 @@
+# symbol_index.py
+import re
+import threading
+from . import config
+
+
+class SymbolArticleIndex:
+    """
+    Inverted index from stock symbols to the article IDs that mention them.
+
+    All tickers and aliases are compiled into a single regex, so tagging an article costs one pass
+    over its text regardless of how many symbols are configured. Lookups are a dict access, which keeps
+    the news/price join proportional to the number of matching articles rather than the session size.
+    """
+
+    def __init__(self, symbol_aliases=None, symbols=None):
+        symbols = symbols if symbols is not None else config.STOCK_SYMBOLS
+        symbol_aliases = symbol_aliases if symbol_aliases is not None else config.SYMBOL_ALIASES
+
+        # Tickers only match in upper case ("SPY", not "spy agency"); company-name aliases match in any case
+        self._ticker_to_symbol = {symbol.upper(): symbol for symbol in symbols}
+        self._alias_to_symbol = {alias.lower(): symbol for symbol in symbols
+                                 for alias in symbol_aliases.get(symbol, [])}
+
+        # Longest alternatives first so "S&P 500" wins over a shorter overlapping alias
+        groups = []
+        if self._ticker_to_symbol:
+            groups.append(r"(?P<ticker>" + self._alternation(self._ticker_to_symbol) + r")")
+        if self._alias_to_symbol:
+            groups.append(r"(?i:(?P<alias>" + self._alternation(self._alias_to_symbol) + r"))")
+        self._pattern = re.compile(
+            r"(?<![\w&])(?:" + "|".join(groups) + r")(?![\w&])") if groups else None
+
+        self._lock = threading.Lock()
+        self._symbol_to_articles = {}  # { "AAPL": ["article_id", ...] }
+
+    @staticmethod
+    def _alternation(terms):
+        return "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+
+    def _symbol_for_match(self, match):
+        if match.lastgroup == "ticker":
+            return self._ticker_to_symbol[match.group("ticker")]
+        return self._alias_to_symbol[match.group("alias").lower()]
+
+    def match_symbols(self, text):
+        """Returns the sorted list of symbols mentioned in text."""
+        if not text or self._pattern is None:
+            return []
+        return sorted({self._symbol_for_match(m) for m in self._pattern.finditer(text)})
+
+    def add(self, article_id, symbols):
+        with self._lock:
+            for symbol in symbols:
+                self._symbol_to_articles.setdefault(symbol, []).append(article_id)
+
+    def to_dict(self):
+        """JSON-serializable form, suitable for event payloads."""
+        with self._lock:
+            return {symbol: list(ids) for symbol, ids in self._symbol_to_articles.items()}
@@ -7,6 +7,7 @@ from google.cloud import bigquery
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import datetime
 from . import config
+from .article_processing import score_sentiment
 
 logger = logging.getLogger(__name__)
 
@@ -34,19 +35,12 @@ class TrendIdentificationAgent(adk.Agent):
         self.register_event_handler(config.EVENT_FINANCIAL_PROCESSED_FOR_SESSION,
                                     self.handle_financial_processed_for_session)
 
-    def _get_sentiment_label(self, compound_score):
-        if compound_score >= 0.05:
-            return 'positive'
-        elif compound_score <= -0.05:
-            return 'negative'
-        else:
-            return 'neutral'
-
     def _perform_sentiment_analysis(self, session_id):
         logger.info(f"[{session_id}] Performing sentiment analysis on news.")
         news_table_ref = f"{config.BQ_PROJECT_ID}.{config.BQ_DATASET_ID}.{config.BQ_TABLE_PROCESSED_NEWS}"
 
         # Query for articles in the session that haven't been analyzed yet
+        # (articles handled by pipeline worker processes are scored at ingestion and skipped here)
         query = f"""
             SELECT article_id, title, summary_cleaned
             FROM `{news_table_ref}`
@@ -59,14 +53,7 @@ class TrendIdentificationAgent(adk.Agent):
         try:
             query_job = self.bq_client.query(query, job_config=job_config)
             for row in query_job:  # Iterate over BQ results
-                text_to_analyze = (row.title or "") + " " + (row.summary_cleaned or "")
-                if not text_to_analyze.strip():
-                    sentiment_score = 0.0
-                    sentiment_label = 'neutral'
-                else:
-                    scores = self.sid.polarity_scores(text_to_analyze)
-                    sentiment_score = scores['compound']
-                    sentiment_label = self._get_sentiment_label(sentiment_score)
+                sentiment_score, sentiment_label = score_sentiment(self.sid, row.title, row.summary_cleaned)
 
                 rows_to_update.append({
                     "article_id": row.article_id,
@@ -196,16 +183,25 @@ class TrendIdentificationAgent(adk.Agent):
         if status.get("news_analyzed") and status.get("financial_analyzed"):
             logger.info(
                 f"[{session_id}] Both news and financial analysis complete. Publishing trends identified event.")
-            self.publish(config.EVENT_TRENDS_IDENTIFIED_FOR_SESSION, {"session_id": session_id})
+            self.publish(config.EVENT_TRENDS_IDENTIFIED_FOR_SESSION, {
+                "session_id": session_id,
+                "symbol_article_index": status.get("symbol_article_index", {})
+            })
             del self.processed_session_status[session_id]  # Clean up
 
     def handle_news_processed_for_session(self, event_name, event_data):
         session_id = event_data["session_id"]
         logger.info(f"[{session_id}] Received news processed for session. Starting sentiment analysis.")
+        if event_data.get("complete") is False:
+            logger.warning(f"[{session_id}] News processing was partial: {event_data.get('persisted')} of "
+                           f"{event_data.get('expected')} rows persisted, {event_data.get('failed')} failed.")
 
         analysis_success = self._perform_sentiment_analysis(session_id)
 
-        self.processed_session_status.setdefault(session_id, {})["news_analyzed"] = analysis_success
+        status = self.processed_session_status.setdefault(session_id, {})
+        status["news_analyzed"] = analysis_success
+        # Forwarded as-is so ReportGenerationAgent can join news to price moves without rescanning articles
+        status["symbol_article_index"] = event_data.get("symbol_article_index", {})
         if not analysis_success:
             logger.error(f"[{session_id}] Sentiment analysis failed. Trend identification might be incomplete.")
 
@@ -214,6 +210,9 @@ class TrendIdentificationAgent(adk.Agent):
     def handle_financial_processed_for_session(self, event_name, event_data):
         session_id = event_data["session_id"]
         logger.info(f"[{session_id}] Received financial data processed for session. Starting anomaly detection.")
+        if event_data.get("complete") is False:
+            logger.warning(f"[{session_id}] Financial processing was partial: {event_data.get('persisted')} of "
+                           f"{event_data.get('expected')} rows persisted, {event_data.get('failed')} failed.")
 
         analysis_success = self._perform_financial_anomaly_detection(session_id)
 